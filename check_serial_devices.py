@@ -3,107 +3,207 @@
 Check all available serial devices and their properties
 """
 
+import glob
+import grp
 import os
+import pwd
+import re
+import stat
 import subprocess
+import sys
+import termios
 from datetime import datetime
 
+# Add src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from diag_log import open_diag_log
+
+_TTYUSB_RE = re.compile(rb'ttyUSB', re.I)
+
+# Local-mode echo flags, checked in one pass against termios lflag
+ECHO_FLAGS = [
+    ('ECHO', termios.ECHO),
+    ('ECHOE', termios.ECHOE),
+    ('ECHOK', termios.ECHOK),
+    ('ECHONL', termios.ECHONL),
+]
+ECHO_MASK = termios.ECHO | termios.ECHOE | termios.ECHOK | termios.ECHONL
+
+
+def _describe_device(path):
+    """Format an ls -la style line for a device node"""
+    st = os.stat(path)
+    try:
+        owner = pwd.getpwuid(st.st_uid).pw_name
+    except KeyError:
+        owner = str(st.st_uid)
+    try:
+        group = grp.getgrgid(st.st_gid).gr_name
+    except KeyError:
+        group = str(st.st_gid)
+    return f"{stat.filemode(st.st_mode)} {owner} {group} {path}"
+
+
+# Baud rate constants as reported by tcgetattr
+_BAUD_RATES = {
+    getattr(termios, f'B{rate}'): rate
+    for rate in (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200, 230400)
+    if hasattr(termios, f'B{rate}')
+}
+
+_CHAR_SIZES = {termios.CS5: 5, termios.CS6: 6, termios.CS7: 7, termios.CS8: 8}
+
+
+def _describe_port_settings(device):
+    """Decode serial port settings directly from termios (replaces stty -a)"""
+    fd = os.open(device, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        iflag, _oflag, cflag, lflag, ispeed, _ospeed, _cc = termios.tcgetattr(fd)
+    finally:
+        os.close(fd)
+
+    lines = []
+    lines.append(f"Speed: {_BAUD_RATES.get(ispeed, ispeed)} baud")
+    lines.append(
+        f"Frame: {_CHAR_SIZES.get(cflag & termios.CSIZE, '?')} data bits, "
+        f"parity {'on' if cflag & termios.PARENB else 'off'}, "
+        f"{2 if cflag & termios.CSTOPB else 1} stop bit(s)"
+    )
+    lines.append(
+        f"Flow control: rtscts={'on' if cflag & getattr(termios, 'CRTSCTS', 0) else 'off'}, "
+        f"xonxoff={'on' if iflag & termios.IXON else 'off'}"
+    )
+    lines.append(f"Canonical mode: {'on' if lflag & termios.ICANON else 'off'}")
+    if not lflag & ECHO_MASK:
+        lines.append("Echo: disabled")
+    else:
+        enabled = [name for name, flag in ECHO_FLAGS if lflag & flag]
+        lines.append(f"Echo: ENABLED ({', '.join(enabled)})")
+    return '\n'.join(lines)
+
+
+def _read_sysfs(path):
+    """Read a single-line sysfs attribute, or None if missing"""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _list_usb_devices():
+    """List USB devices from /sys/bus/usb/devices (replaces lsusb)"""
+    lines = []
+    for device_dir in sorted(glob.glob('/sys/bus/usb/devices/*')):
+        vendor = _read_sysfs(os.path.join(device_dir, 'idVendor'))
+        product_id = _read_sysfs(os.path.join(device_dir, 'idProduct'))
+        if vendor is None or product_id is None:
+            continue  # Interface entries have no vendor/product IDs
+        name = ' '.join(filter(None, (
+            _read_sysfs(os.path.join(device_dir, 'manufacturer')),
+            _read_sysfs(os.path.join(device_dir, 'product')),
+        )))
+        lines.append(f"{os.path.basename(device_dir)}: ID {vendor}:{product_id} {name}".rstrip())
+    return lines
+
+
+def _find_processes_using(device):
+    """Find processes holding a device open by scanning /proc/*/fd (replaces lsof)"""
+    users = []
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        fd_dir = f'/proc/{pid}/fd'
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue  # Process exited or not permitted
+        for fd in fds:
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)) == device:
+                    break
+            except OSError:
+                continue
+        else:
+            continue
+        users.append(f"{pid} {_read_sysfs(f'/proc/{pid}/comm') or '?'}")
+    return users
+
+
 def check_serial_devices():
     """List and analyze all serial devices"""
     
-    # Create logs directory if it doesn't exist
-    os.makedirs('logs', exist_ok=True)
+    log_file, log_print = open_diag_log('serial_devices')
+    log_filename = log_file.name
     
-    # Create log file with timestamp
-    log_filename = f"logs/serial_devices_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    
-    with open(log_filename, 'w') as log_file:
-        def log_print(message):
-            """Print to both console and log file"""
-            print(message)
-            log_file.write(message + '\n')
-            log_file.flush()
-        
+    with log_file:
         log_print(f"\n=== Serial Device Check ===")
         log_print(f"Timestamp: {datetime.now()}\n")
         
         # List all tty devices
         log_print("=== Available Serial Devices ===")
         
-        # Check /dev/ttyUSB*
-        log_print("\nUSB Serial devices (/dev/ttyUSB*):")
-        try:
-            usb_devices = subprocess.run(['ls', '-la', '/dev/ttyUSB*'], 
-                                       capture_output=True, text=True, shell=True)
-            if usb_devices.returncode == 0:
-                log_print(usb_devices.stdout)
-            else:
-                log_print("No /dev/ttyUSB* devices found")
-        except Exception as e:
-            log_print(f"Error checking USB devices: {e}")
-        
-        # Check /dev/ttyACM*
-        log_print("\nACM devices (/dev/ttyACM*):")
-        try:
-            acm_devices = subprocess.run(['ls', '-la', '/dev/ttyACM*'], 
-                                       capture_output=True, text=True, shell=True)
-            if acm_devices.returncode == 0:
-                log_print(acm_devices.stdout)
-            else:
-                log_print("No /dev/ttyACM* devices found")
-        except Exception as e:
-            log_print(f"Error checking ACM devices: {e}")
+        # Check /dev/ttyUSB* and /dev/ttyACM*
+        for label, pattern in (("USB Serial devices", '/dev/ttyUSB*'),
+                               ("ACM devices", '/dev/ttyACM*')):
+            log_print(f"\n{label} ({pattern}):")
+            try:
+                devices = sorted(glob.glob(pattern))
+                if devices:
+                    for device in devices:
+                        log_print(_describe_device(device))
+                else:
+                    log_print(f"No {pattern} devices found")
+            except Exception as e:
+                log_print(f"Error checking {pattern} devices: {e}")
         
         # Check dmesg for USB serial info
         log_print("\n=== Recent USB Serial Messages (dmesg) ===")
         try:
-            dmesg = subprocess.run(['dmesg', '|', 'grep', '-i', 'ttyUSB'], 
-                                 capture_output=True, text=True, shell=True)
-            if dmesg.returncode == 0 and dmesg.stdout:
-                log_print(dmesg.stdout)
+            dmesg = subprocess.run(['dmesg'], capture_output=True)
+            matches = [line for line in dmesg.stdout.splitlines()
+                       if _TTYUSB_RE.search(line)]
+            if dmesg.returncode == 0 and matches:
+                log_print(b'\n'.join(matches).decode('utf-8', errors='replace'))
             else:
                 log_print("No recent USB serial messages in dmesg")
         except Exception as e:
             log_print(f"Error checking dmesg: {e}")
         
-        # Check lsusb for USB devices
-        log_print("\n=== USB Devices (lsusb) ===")
+        # List USB devices from sysfs
+        log_print("\n=== USB Devices (sysfs) ===")
         try:
-            lsusb = subprocess.run(['lsusb'], capture_output=True, text=True)
-            if lsusb.returncode == 0:
-                log_print(lsusb.stdout)
+            usb_devices = _list_usb_devices()
+            if usb_devices:
+                log_print('\n'.join(usb_devices))
             else:
                 log_print("Could not list USB devices")
         except Exception as e:
-            log_print(f"Error running lsusb: {e}")
+            log_print(f"Error listing USB devices: {e}")
         
         # Check who's using the serial port
         log_print("\n=== Processes Using Serial Ports ===")
         try:
             # Check for /dev/ttyUSB0 specifically
-            lsof = subprocess.run(['lsof', '/dev/ttyUSB0'], 
-                                capture_output=True, text=True)
-            if lsof.returncode == 0 and lsof.stdout:
-                log_print("Processes using /dev/ttyUSB0:")
-                log_print(lsof.stdout)
+            users = _find_processes_using('/dev/ttyUSB0')
+            if users:
+                log_print("Processes using /dev/ttyUSB0 (PID COMMAND):")
+                log_print('\n'.join(users))
             else:
                 log_print("No processes currently using /dev/ttyUSB0")
         except Exception as e:
             log_print(f"Error checking processes: {e}")
         
-        # Check serial port info using stty
-        log_print("\n=== Serial Port Settings (stty) ===")
-        try:
-            for device in ['/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyACM0']:
-                if os.path.exists(device):
-                    log_print(f"\nSettings for {device}:")
-                    stty = subprocess.run(['stty', '-F', device, '-a'], 
-                                        capture_output=True, text=True)
-                    if stty.returncode == 0:
-                        log_print(stty.stdout)
-                    else:
-                        log_print(f"Could not read settings: {stty.stderr}")
-        except Exception as e:
-            log_print(f"Error checking stty: {e}")
+        # Check serial port info using termios
+        log_print("\n=== Serial Port Settings (termios) ===")
+        for device in ['/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyACM0']:
+            if os.path.exists(device):
+                log_print(f"\nSettings for {device}:")
+                try:
+                    log_print(_describe_port_settings(device))
+                except (OSError, termios.error) as e:
+                    log_print(f"Could not read settings: {e}")
         
         log_print(f"\n✓ Device check saved to: {log_filename}")
         
@@ -20,7 +20,7 @@ sudo apt upgrade -y
 
 # Install required dependencies
 echo "🔧 Installing dependencies..."
-sudo apt install -y curl wget git python3-pip
+sudo apt install -y curl wget git python3-pip libyaml-dev
 
 # Install Python dependencies for the serial client
 echo "🐍 Installing Python dependencies..."
@@ -7,14 +7,32 @@ assembly program and forwards messages to TinyLLM for AI processing.
 """
 
 import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
 import yaml
 import os
+import re
 import sys
 import time
 import signal
+import queue
+import threading
 from pathlib import Path
 from collections import deque
-from datetime import datetime, timedelta
+
+# Optional Aho-Corasick automaton for echo matching; falls back to a compiled regex
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Prefer the libyaml C bindings (install libyaml-dev before PyYAML to get them)
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
 
 # Add src directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
@@ -24,6 +42,29 @@ from message_processor import MessageProcessor
 from llm_interface import LLMManager
 from logger import LoggerSetup, log_serial_event, log_process_event, log_llm_event, log_system_event
 
+# Basic configuration written when the requested config file does not exist
+DEFAULT_CONFIG = {
+    'serial': {'port': '/dev/ttyUSB0', 'baudrate': 9600},
+    'tinyllm': {'interface_type': 'mock'},
+    'logging': {'level': 'INFO', 'console': True}
+}
+
+# Our response suffix - any received line containing it is an echo
+_ECHO_MARKERS = ("<<<END>>>",)
+
+def _echo_digest(message: str) -> bytes:
+    """Short hash of a message line used for O(1) echo lookups"""
+    return hashlib.blake2b(message.encode('utf-8', errors='replace'), digest_size=8).digest()
+
+
+# Periodic statistics line, bound once at import
+_format_stats = (
+    "Stats - Messages: {total_messages}, "
+    "Valid: {valid_messages}, "
+    "LLM Success: {successful_requests}, "
+    "Avg Response: {average_response_time:.2f}s"
+).format_map
+
 
 class TinyLLMSerialClient:
     """Main application class"""
@@ -37,7 +78,9 @@ class TinyLLMSerialClient:
         """
         self.config = self._load_config(config_path)
         self.test_mode = test_mode
-        self.running = False
+        
+        # Set on shutdown signal or stop(); the main loops block on it
+        self._stop_event = threading.Event()
         
         # Setup logging
         log_config = self.config.get('logging', {})
@@ -60,9 +103,50 @@ class TinyLLMSerialClient:
         self.message_processor = MessageProcessor(self.config.get('client', {}))
         self.llm_manager = LLMManager(self.config.get('tinyllm', {}))
         
+        # LLM calls run on a small worker pool so the serial reader thread is never blocked
+        self._llm_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.config.get('tinyllm', {}).get('max_workers', 2),
+            thread_name_prefix='llm'
+        )
+        self._send_lock = threading.Lock()
+        
+        # Replies are sent in request order even when workers finish out of order
+        self._reply_seq = itertools.count()
+        self._reply_next = 0
+        self._reply_pending = {}  # Sequence number -> (processed message, response)
+        self._reply_lock = threading.Lock()
+        self._echo_lock = threading.Lock()
+        
         # Echo detection - store recently sent messages with timestamps
         self.sent_messages = deque(maxlen=10)  # Keep last 10 sent messages
         self.echo_timeout = 2.0  # Messages older than 2 seconds are not considered echoes
+        self._sent_hashes = {}  # Digest of each sent line -> monotonic time it was sent
+        self._echo_matcher_key = None  # Messages the echo matcher was built from; rebuilt lazily
+        self._echo_search = None
+        
+        # Response formatting settings, resolved once
+        response_config = self.config.get('response', {})
+        self._resp_enabled = response_config.get('enabled', True)
+        self._resp_prefix = response_config.get('prefix', 'AI: ')
+        self._resp_suffix = response_config.get('suffix', '\n---\n')
+        self._resp_limit = (response_config.get('max_length', 500)
+                            - len(self._resp_prefix) - len(self._resp_suffix))
+        
+        # Transaction log (JSON Lines) is opened once and kept open (buffered) for the lifetime of the client
+        # Writes happen on a background thread fed by a queue so disk I/O stays off the serial callback path
+        self._txn_fp = None
+        self._txn_queue = queue.Queue()
+        self._txn_thread = None
+        transaction_log = log_config.get('transaction_file')
+        if transaction_log:
+            try:
+                self._txn_fp = open(transaction_log, 'a', buffering=8192, encoding='utf-8')
+            except OSError as e:
+                self.logger.error(f"Failed to open transaction log: {e}")
+            else:
+                self._txn_thread = threading.Thread(target=self._txn_drain, name='txn-log')
+                self._txn_thread.daemon = True
+                self._txn_thread.start()
         
         # Setup signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -79,7 +163,7 @@ class TinyLLMSerialClient:
         """
         try:
             with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
+                config = yaml.load(f, Loader=YamlLoader)
             print(f"Configuration loaded from {config_path}")
             return config
         except FileNotFoundError:
@@ -87,12 +171,14 @@ class TinyLLMSerialClient:
             sys.exit(1)
         except yaml.YAMLError as e:
             print(f"Error: Invalid YAML in configuration file: {e}")
+            if YamlLoader.__name__ != 'CSafeLoader':
+                print("Note: using pure-Python YAML parser; install libyaml-dev and reinstall PyYAML for faster loading")
             sys.exit(1)
             
     def _signal_handler(self, signum, frame):
-        """Handle shutdown signals"""
+        """Handle shutdown signals by waking the main loop, which then stops the client"""
         log_system_event(self.logger, "Shutdown signal received, stopping client...")
-        self.stop()
+        self._stop_event.set()
         
     def _is_echo_message(self, received_message: str) -> bool:
         """Check if received message is an echo of recently sent message
@@ -106,29 +192,113 @@ class TinyLLMSerialClient:
         # Clean up the received message for comparison
         received_clean = received_message.strip()
         
+        # Sent-message state is updated from LLM worker threads
+        with self._echo_lock:
+            return self._match_echo(received_clean)
+            
+    def _match_echo(self, received_clean: str) -> bool:
+        """Match a cleaned received message against recently sent messages (echo lock held)"""
         # Get current time
-        now = datetime.now()
+        now = time.monotonic()
+        timeout = self.echo_timeout
+        
+        # Fast path - exact match against a line we recently sent
+        sent_time = self._sent_hashes.get(_echo_digest(received_clean))
+        if sent_time is not None and now - sent_time <= timeout:
+            time_diff = now - sent_time
+            log_process_event(self.logger, 
+                f"Echo detected: '{received_clean[:50]}...' "
+                f"(matches message sent {time_diff:.3f}s ago)", "debug")
+            return True
         
-        # Check against recently sent messages
-        for sent_time, sent_msg in self.sent_messages:
-            # Skip messages older than echo timeout
-            if now - sent_time > timedelta(seconds=self.echo_timeout):
-                continue
-                
-            # Check for exact match or partial match
-            # Handle case where received message might be truncated or have extra chars
-            if (sent_msg in received_clean or 
-                received_clean in sent_msg or
-                received_clean.startswith("AI:") or  # Our response prefix
-                "<<<END>>>" in received_clean):  # Our response suffix
-                
-                time_diff = (now - sent_time).total_seconds()
-                log_process_event(self.logger, 
-                    f"Echo detected: '{received_clean[:50]}...' "
-                    f"(matches message sent {time_diff:.3f}s ago)", "debug")
-                return True
+        # Slow path - partial matches against the few recently sent messages
+        recent = {sent_msg: sent_time for sent_time, sent_msg in self.sent_messages
+                  if now - sent_time <= timeout}
+        if not recent:
+            return False
+            
+        sent_time = None
+        if received_clean.startswith("AI:"):  # Our response prefix
+            sent_time = max(recent.values())
+        else:
+            # One scan finds any recently sent message or marker contained in the received text
+            matcher_key = tuple(recent)
+            if self._echo_matcher_key != matcher_key:
+                self._echo_search = self._build_echo_matcher(matcher_key)
+                self._echo_matcher_key = matcher_key
+            for match in self._echo_search(received_clean):
+                if match in recent:
+                    sent_time = recent[match]
+                    break
+                if match in _ECHO_MARKERS:
+                    sent_time = max(recent.values())
+                    break
+            else:
+                # Received message might be a truncated fragment of a sent one
+                for sent_msg, candidate_time in recent.items():
+                    if received_clean in sent_msg:
+                        sent_time = candidate_time
+                        break
+                        
+        if sent_time is None:
+            return False
+            
+        time_diff = now - sent_time
+        log_process_event(self.logger, 
+            f"Echo detected: '{received_clean[:50]}...' "
+            f"(matches message sent {time_diff:.3f}s ago)", "debug")
+        return True
+        
+    def _build_echo_matcher(self, sent_messages):
+        """Build a multi-pattern matcher over echo markers and recently sent messages
+        
+        Args:
+            sent_messages: Sent messages still inside the echo window
+            
+        Returns:
+            Function yielding every pattern found in a given text
+        """
+        patterns = set(_ECHO_MARKERS)
+        patterns.update(sent_messages)
+        
+        if ahocorasick:
+            automaton = ahocorasick.Automaton()
+            for pattern in patterns:
+                automaton.add_word(pattern, pattern)
+            automaton.make_automaton()
+            return lambda text: (pattern for _, pattern in automaton.iter(text))
+            
+        # Longest first so a full sent message wins over a marker it contains
+        regex = re.compile('|'.join(re.escape(p) for p in sorted(patterns, key=len, reverse=True)))
+        return lambda text: (m.group() for m in regex.finditer(text))
+        
+    def _track_sent_message(self, message: str):
+        """Remember a sent message so its echo can be recognised
+        
+        Args:
+            message: Message as written to the serial port
+        """
+        with self._echo_lock:
+            self._record_sent(message.strip())
+            
+    def _record_sent(self, message: str):
+        """Index a stripped sent message for echo detection (echo lock held)"""
+        now = time.monotonic()
+        timeout = self.echo_timeout
+        
+        # Expire old digests so the index stays small
+        expired = [digest for digest, sent_time in self._sent_hashes.items() if now - sent_time > timeout]
+        for digest in expired:
+            del self._sent_hashes[digest]
+            
+        # The serial reader splits on newlines, so index each line as well as the whole message
+        self._sent_hashes[_echo_digest(message)] = now
+        for line in message.splitlines():
+            line = line.strip()
+            if line:
+                self._sent_hashes[_echo_digest(line)] = now
                 
-        return False
+        self.sent_messages.append((now, message))
         
     def message_callback(self, raw_message: str):
         """Callback to handle received messages
@@ -153,9 +323,44 @@ class TinyLLMSerialClient:
         # Format for LLM
         llm_input = self.message_processor.format_message_for_llm(processed)
         
-        # Forward to LLM
-        response = self.llm_manager.process_message(llm_input)
+        # Forward to LLM on the worker pool; the response is handled when it completes
+        seq = next(self._reply_seq)
+        future = self._llm_pool.submit(self.llm_manager.process_message, llm_input)
+        future.add_done_callback(lambda f: self._on_llm_done(seq, processed, f))
         
+    def _on_llm_done(self, seq: int, processed: dict, future: concurrent.futures.Future):
+        """Handle a completed LLM request, releasing replies in request order
+        
+        Args:
+            seq: Sequence number the request was submitted with
+            processed: Processed message dictionary the request was made for
+            future: Completed future holding the LLM response
+        """
+        if future.cancelled():
+            log_llm_event(self.logger, "LLM request cancelled on shutdown", "debug")
+            response = None
+        else:
+            try:
+                response = future.result()
+            except Exception as e:
+                log_llm_event(self.logger, f"LLM request raised: {e}", "error")
+                response = None
+            
+        # Hold finished replies until every earlier request has been answered
+        with self._reply_lock:
+            self._reply_pending[seq] = (processed, response)
+            while self._reply_next in self._reply_pending:
+                processed, response = self._reply_pending.pop(self._reply_next)
+                self._reply_next += 1
+                self._handle_reply(processed, response)
+                
+    def _handle_reply(self, processed: dict, response: str):
+        """Send an LLM response back and log the transaction
+        
+        Args:
+            processed: Processed message dictionary the request was made for
+            response: LLM response, or None if the request failed
+        """
         if response:
             log_llm_event(self.logger, f"Processing complete")
             
@@ -179,35 +384,29 @@ class TinyLLMSerialClient:
         Returns:
             bool: True if sent successfully
         """
-        # Get response sending configuration
-        response_config = self.config.get('response', {})
-        
         # Check if response sending is enabled
-        if not response_config.get('enabled', True):
+        if not self._resp_enabled:
             self.logger.debug("Response sending disabled in configuration")
             return True
             
-        # Prepare response for sending
-        max_length = response_config.get('max_length', 500)
-        prefix = response_config.get('prefix', 'AI: ')
-        suffix = response_config.get('suffix', '\n---\n')
-        
         # Truncate response if too long
-        if len(response) > max_length - len(prefix) - len(suffix):
-            response = response[:max_length - len(prefix) - len(suffix) - 3] + "..."
+        if len(response) > self._resp_limit:
+            response = response[:self._resp_limit - 3] + "..."
             
         # Format final message with clear terminator
         # Add a special end-of-message marker that ARM can detect
-        formatted_response = f"{prefix}{response}\n{suffix}"
+        formatted_response = f"{self._resp_prefix}{response}\n{self._resp_suffix}"
         
-        # Track sent message for echo detection
-        self.sent_messages.append((datetime.now(), formatted_response.strip()))
-        
-        # Send via serial client
-        return self.serial_client.send_message(formatted_response)
+        # Workers may finish concurrently - keep each response's track+send atomic
+        with self._send_lock:
+            # Track sent message for echo detection
+            self._track_sent_message(formatted_response)
+            
+            # Send via serial client
+            return self.serial_client.send_message(formatted_response)
             
     def _log_transaction(self, processed_message: dict, llm_response: str):
-        """Log complete transaction to file
+        """Log complete transaction to file as a single JSON line
         
         Args:
             processed_message: Processed message dictionary
@@ -221,15 +420,35 @@ class TinyLLMSerialClient:
             'llm_response': llm_response
         }
         
-        # Write to transaction log (optional separate file)
-        transaction_log = self.config.get('logging', {}).get('transaction_file')
-        if transaction_log:
+        # Hand off to the transaction log writer (optional separate file)
+        if self._txn_thread:
+            self._txn_queue.put(transaction)
+            
+    def _txn_drain(self):
+        """Background writer for the transaction log
+        
+        Blocks for the next transaction, greedily drains up to 32 queued ones,
+        writes them in one batch and flushes. A None item stops the writer.
+        """
+        while True:
+            batch = [self._txn_queue.get()]
+            try:
+                while len(batch) < 32:
+                    batch.append(self._txn_queue.get_nowait())
+            except queue.Empty:
+                pass
+                
+            stop = None in batch
+            lines = [json.dumps(txn, separators=(',', ':')) + '\n' for txn in batch if txn is not None]
             try:
-                with open(transaction_log, 'a') as f:
-                    f.write(f"{yaml.dump(transaction, default_flow_style=False)}\n---\n")
+                self._txn_fp.write(''.join(lines))
+                self._txn_fp.flush()
             except Exception as e:
                 self.logger.error(f"Failed to write transaction log: {e}")
                 
+            if stop:
+                return
+                
     def run_test_mode(self):
         """Run in test mode with predefined messages"""
         log_system_event(self.logger, "Starting in TEST MODE")
@@ -243,7 +462,8 @@ class TinyLLMSerialClient:
         for i, message in enumerate(test_messages, 1):
             log_serial_event(self.logger, f"Simulating message {i}/{len(test_messages)}: \"{message}\"")
             self.message_callback(message)
-            time.sleep(2)  # Delay between messages
+            if self._stop_event.wait(2):  # Delay between messages
+                break
             
         log_system_event(self.logger, "Test mode completed")
         
@@ -262,9 +482,8 @@ class TinyLLMSerialClient:
             self.serial_client.start(simple_callback)
             log_serial_event(self.logger, "Ready for serial data (no LLM processing)...")
             
-            # Keep running until interrupted
-            while True:
-                time.sleep(1)
+            # Block until a shutdown signal arrives
+            self._stop_event.wait()
                 
         except KeyboardInterrupt:
             log_system_event(self.logger, "Serial test mode interrupted")
@@ -284,16 +503,10 @@ class TinyLLMSerialClient:
             self.serial_client.start(self.message_callback)
             log_serial_event(self.logger, "Ready to receive messages...")
             
-            self.running = True
-            
-            # Main loop
-            while self.running:
-                time.sleep(1)
+            # Main loop - sleeps until shutdown, waking once per minute to log statistics
+            while not self._stop_event.wait(timeout=60):
+                self._log_statistics()
                 
-                # Periodically log statistics
-                if int(time.time()) % 60 == 0:  # Every minute
-                    self._log_statistics()
-                    
         except KeyboardInterrupt:
             log_system_event(self.logger, "Application interrupted by user")
         except Exception as e:
@@ -303,28 +516,41 @@ class TinyLLMSerialClient:
             
     def stop(self):
         """Stop the application"""
-        self.running = False
+        self._stop_event.set()
         
         log_system_event(self.logger, "Stopping serial client...")
         self.serial_client.stop()
+        # Replies can no longer be sent, so drop queued requests and only wait for in-flight ones
+        self._llm_pool.shutdown(wait=True, cancel_futures=True)
+        self.llm_manager.close()
         
         # Log final statistics
         self._log_statistics()
         
+        # Drain pending transactions, then close the log
+        if self._txn_thread:
+            self._txn_queue.put(None)
+            self._txn_thread.join(timeout=5)
+            self._txn_thread = None
+        if self._txn_fp:
+            try:
+                self._txn_fp.close()
+            except Exception as e:
+                self.logger.error(f"Failed to close transaction log: {e}")
+            self._txn_fp = None
+        
         log_system_event(self.logger, "Application stopped")
         
     def _log_statistics(self):
         """Log performance statistics"""
-        serial_stats = self.serial_client.get_stats()
         processor_stats = self.message_processor.get_stats()
         llm_stats = self.llm_manager.get_stats()
         
-        log_system_event(self.logger, 
-            f"Stats - Messages: {processor_stats['total_messages']}, "
-            f"Valid: {processor_stats['valid_messages']}, "
-            f"LLM Success: {llm_stats['successful_requests']}, "
-            f"Avg Response: {llm_stats.get('average_response_time', 0):.2f}s"
-        )
+        log_system_event(self.logger, _format_stats({
+            **processor_stats,
+            **llm_stats,
+            'average_response_time': llm_stats.get('average_response_time', 0)
+        }))
 
 
 def main():
@@ -383,15 +609,8 @@ def main():
         # Create default config directory
         os.makedirs(os.path.dirname(config_path), exist_ok=True)
         
-        # Create basic config
-        default_config = {
-            'serial': {'port': '/dev/ttyUSB0', 'baudrate': 9600},
-            'tinyllm': {'interface_type': 'mock'},
-            'logging': {'level': 'INFO', 'console': True}
-        }
-        
         with open(config_path, 'w') as f:
-            yaml.dump(default_config, f, default_flow_style=False)
+            yaml.dump(DEFAULT_CONFIG, f, Dumper=YamlDumper, default_flow_style=False)
             
         print(f"Default configuration created at {config_path}")
         print("Please edit the configuration file and run again.")
@@ -0,0 +1,35 @@
+import os
+import time
+from typing import Callable, TextIO, Tuple
+
+
+LOG_DIR = 'logs'
+
+# Set once the logs directory has been created in this process
+_logs_ready = False
+
+
+def open_diag_log(prefix: str) -> Tuple[TextIO, Callable[[str], None]]:
+    """Open a timestamped diagnostic log and return a print-and-log helper
+    
+    Args:
+        prefix: Log file name prefix (e.g. 'serial_devices')
+        
+    Returns:
+        Tuple of (open log file, log_print function). The caller owns the
+        file and should close it (e.g. with a ``with`` block) when done.
+    """
+    global _logs_ready
+    if not _logs_ready:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        _logs_ready = True
+        
+    log_filename = os.path.join(LOG_DIR, f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}.log")
+    log_file = open(log_filename, 'w', buffering=8192)
+    
+    def log_print(message: str):
+        """Print to both console and log file"""
+        print(message)
+        log_file.write(message + '\n')
+        
+    return log_file, log_print
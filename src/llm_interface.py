@@ -1,12 +1,23 @@
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import re
 import time
+import hashlib
 import logging
+import queue
+import threading
+from collections import OrderedDict, deque
 from typing import Optional, Dict, Any
 from abc import ABC, abstractmethod
 
 
+# End of a sentence in streamed text - a terminator followed by whitespace (so decimals
+# like 3.14 don't count) or a blank line
+_SENTENCE_END = re.compile(r'[.!?](?=\s)|\n\n')
+
+
 class LLMInterface(ABC):
     """Abstract base class for LLM interfaces"""
     
@@ -29,6 +40,15 @@ class CommandLineLLM(LLMInterface):
         self.timeout = config.get('timeout', 30)
         self.logger = logging.getLogger(__name__)
         
+        # Persistent mode keeps one long-lived process (model loaded once) and exchanges
+        # newline-delimited prompts/responses over stdin/stdout, terminated by a sentinel line
+        self.persistent = config.get('persistent', False)
+        self.server_args = config.get('server_args', ['--server'])
+        self.sentinel = config.get('sentinel', '<<<END>>>')
+        self.proc = None
+        self._lines = None
+        self._lock = threading.Lock()
+        
     def generate(self, prompt: str) -> Optional[str]:
         """Generate response using command line tool
         
@@ -38,26 +58,29 @@ class CommandLineLLM(LLMInterface):
         Returns:
             Generated response or None if failed
         """
+        if self.persistent:
+            return self._generate_persistent(prompt)
+            
         try:
             # Prepare command
             cmd = [self.command, prompt]
             
-            self.logger.debug(f"Executing LLM command: {' '.join(cmd)}")
+            self.logger.debug("Executing LLM command: %s", cmd)
             
             # Execute command
             result = subprocess.run(
                 cmd,
                 capture_output=True,
-                text=True,
                 timeout=self.timeout
             )
             
+            # Decode the captured bytes once rather than through a text wrapper
             if result.returncode == 0:
-                response = result.stdout.strip()
-                self.logger.debug(f"LLM response: {response}")
+                response = result.stdout.decode('utf-8', 'replace').strip()
+                self.logger.debug("LLM response: %s", response)
                 return response
             else:
-                self.logger.error(f"LLM command failed: {result.stderr}")
+                self.logger.error(f"LLM command failed: {result.stderr.decode('utf-8', 'replace')}")
                 return None
                 
         except subprocess.TimeoutExpired:
@@ -70,6 +93,95 @@ class CommandLineLLM(LLMInterface):
             self.logger.error(f"Unexpected error calling LLM: {e}")
             return None
             
+    def _start_process(self):
+        """Start the long-lived LLM process and its stdout reader thread"""
+        cmd = [self.command, *self.server_args]
+        self.logger.info(f"Starting persistent LLM process: {' '.join(cmd)}")
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._pump_stdout, args=(self.proc, self._lines))
+        reader.daemon = True
+        reader.start()
+        
+    @staticmethod
+    def _pump_stdout(proc: subprocess.Popen, lines: queue.Queue):
+        """Forward process output lines to a queue (None marks EOF)"""
+        with proc.stdout:
+            for line in proc.stdout:
+                lines.put(line)
+        lines.put(None)
+        
+    def _generate_persistent(self, prompt: str) -> Optional[str]:
+        """Generate response using the persistent LLM process"""
+        with self._lock:
+            try:
+                # Respawn if the process has never started or has exited
+                if self.proc is None or self.proc.poll() is not None:
+                    self._start_process()
+                    
+                # Prompts are framed as a single line followed by the sentinel line
+                frame = prompt.replace('\n', ' ')
+                self.proc.stdin.write(f"{frame}\n{self.sentinel}\n")
+                self.proc.stdin.flush()
+                
+                deadline = time.monotonic() + self.timeout
+                output = []
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    line = self._lines.get(timeout=remaining)
+                    if line is None:
+                        self.logger.error("Persistent LLM process exited unexpectedly")
+                        self._stop_process()
+                        return None
+                    if line.rstrip('\r\n') == self.sentinel:
+                        break
+                    output.append(line)
+                    
+                response = ''.join(output).strip()
+                self.logger.debug("LLM response: %s", response)
+                return response
+                
+            except queue.Empty:
+                self.logger.error(f"LLM command timed out after {self.timeout} seconds")
+                self._stop_process()
+                return None
+            except FileNotFoundError:
+                self.logger.error(f"LLM command '{self.command}' not found")
+                return None
+            except Exception as e:
+                self.logger.error(f"Unexpected error calling LLM: {e}")
+                self._stop_process()
+                return None
+                
+    def _stop_process(self):
+        """Terminate the persistent LLM process if running"""
+        if self.proc is None:
+            return
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5)
+        except Exception as e:
+            self.logger.error(f"Error stopping LLM process: {e}")
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass  # Input still buffered for a process that's gone
+        self.proc = None
+        
+    def close(self):
+        """Release the persistent LLM process"""
+        with self._lock:
+            self._stop_process()
+            
     def is_available(self) -> bool:
         """Check if command line tool is available"""
         try:
@@ -93,6 +205,31 @@ class APILLM(LLMInterface):
         self.headers = config.get('headers', {'Content-Type': 'application/json'})
         self.logger = logging.getLogger(__name__)
         
+        # Pooled session keeps the connection to Ollama alive between requests
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Cached availability check as (monotonic time checked, result)
+        self.availability_ttl = config.get('availability_ttl', 10)
+        self._avail_cache = (float('-inf'), False)
+        
+        # Prefix reuse - a stable system prompt kept loaded lets Ollama reuse its KV cache
+        # for the shared prefix. reuse_context also chains each turn onto the previous one,
+        # so replies depend on earlier, unrelated messages - off unless asked for.
+        self._system = config.get('system_prompt')
+        self.keep_alive = config.get('keep_alive', '30m')
+        self.reuse_context = config.get('reuse_context', False)
+        self._last_context = None
+        self._context_lock = threading.Lock()  # Requests may run on several worker threads
+        
+        # Streaming - return as soon as a full sentence (or max_response_chars) has arrived
+        self.stream = config.get('stream', False)
+        self.stop_at_sentence = config.get('stop_at_sentence', True)
+        self.max_response_chars = config.get('max_response_chars')
+        
     def generate(self, prompt: str) -> Optional[str]:
         """Generate response using HTTP API
         
@@ -107,29 +244,43 @@ class APILLM(LLMInterface):
             payload = {
                 'model': self.config.get('model', 'tinyllama'),
                 'prompt': prompt,
-                'stream': False,
+                'stream': self.stream,
                 'options': {
                     'temperature': self.config.get('temperature', 0.7),
                     'num_predict': self.config.get('max_tokens', 100)
-                }
+                },
+                'keep_alive': self.keep_alive
             }
+            if self._system:
+                payload['system'] = self._system
+            if self.reuse_context:
+                with self._context_lock:
+                    context = self._last_context
+                if context is not None:
+                    payload['context'] = context
             
-            self.logger.debug(f"Sending request to LLM API: {self.endpoint}")
-            self.logger.debug(f"Payload: {payload}")
+            self.logger.debug("Sending request to LLM API: %s", self.endpoint)
+            self.logger.debug("Payload: %s", payload)
             
             # Make API request
-            response = requests.post(
+            response = self.session.post(
                 self.endpoint,
                 json=payload,
-                headers=self.headers,
-                timeout=self.timeout
+                timeout=self.timeout,
+                stream=self.stream
             )
             
-            if response.status_code == 200:
+            if response.status_code == 200 and self.stream:
+                generated_text = self._read_stream(response)
+                self.logger.debug("LLM response: %s", generated_text)
+                return generated_text.strip()
+            elif response.status_code == 200:
                 data = response.json()
                 # Ollama returns response in 'response' field
                 generated_text = data.get('response', '')
-                self.logger.debug(f"LLM response: {generated_text}")
+                if self.reuse_context:
+                    self._set_context(data.get('context'))
+                self.logger.debug("LLM response: %s", generated_text)
                 return generated_text.strip()
             else:
                 self.logger.error(f"LLM API error: {response.status_code} - {response.text}")
@@ -145,22 +296,79 @@ class APILLM(LLMInterface):
             self.logger.error(f"Unexpected error calling LLM API: {e}")
             return None
             
-    def is_available(self) -> bool:
-        """Check if Ollama API is available"""
+    def _read_stream(self, response) -> str:
+        """Consume a streamed Ollama response, stopping early once enough text has arrived
+        
+        Args:
+            response: Streaming HTTP response of newline-delimited JSON chunks
+            
+        Returns:
+            Generated text received so far
+        """
+        text = ''
+        scanned = 0  # Sentence ends before this offset have already been ruled out
         try:
-            # Check Ollama root endpoint
-            health_endpoint = self.endpoint.replace('/api/generate', '/')
-            response = requests.get(health_endpoint, timeout=5)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                text += chunk.get('response', '')
+                
+                if chunk.get('done'):
+                    if self.reuse_context:
+                        self._set_context(chunk.get('context'))
+                    break
+                    
+                sentence_end = None
+                if self.stop_at_sentence:
+                    # Back up one character - a terminator may only be confirmed by the next token
+                    sentence_end = _SENTENCE_END.search(text, max(0, scanned - 1))
+                    scanned = len(text)
+                    
+                if sentence_end or (self.max_response_chars and len(text) >= self.max_response_chars):
+                    if sentence_end:
+                        text = text[:sentence_end.end()]
+                    # Generation was cut short, so there is no final context to reuse
+                    self._set_context(None)
+                    break
+        finally:
+            response.close()
+        return text
+        
+    def _set_context(self, context):
+        """Store the context to send with the next request"""
+        with self._context_lock:
+            self._last_context = context
+            
+    def reset_context(self):
+        """Forget the conversation context from previous turns"""
+        self._set_context(None)
+        
+    def close(self):
+        """Close pooled HTTP connections"""
+        self.session.close()
+        
+    def is_available(self) -> bool:
+        """Check if Ollama API is available (result cached for availability_ttl seconds)"""
+        now = time.monotonic()
+        checked_at, available = self._avail_cache
+        if now - checked_at < self.availability_ttl:
+            return available
             
-            # Ollama returns "Ollama is running" message
-            if response.status_code == 200:
+        available = self._check_available()
+        self._avail_cache = (now, available)
+        return available
+        
+    def _check_available(self) -> bool:
+        """Query Ollama for the model list - a 200 means the server is up"""
+        try:
+            model_endpoint = self.endpoint.replace('/api/generate', '/api/tags')
+            model_response = self.session.get(model_endpoint, timeout=5)
+            if model_response.status_code == 200:
                 # Also check if our model is available
-                model_endpoint = self.endpoint.replace('/api/generate', '/api/tags')
-                model_response = requests.get(model_endpoint, timeout=5)
-                if model_response.status_code == 200:
-                    models = model_response.json().get('models', [])
-                    model_name = self.config.get('model', 'tinyllama')
-                    return any(model.get('name', '').startswith(model_name) for model in models)
+                models = model_response.json().get('models', [])
+                model_name = self.config.get('model', 'tinyllama')
+                return any(model.get('name', '').startswith(model_name) for model in models)
             return False
         except:
             return False
@@ -179,6 +387,12 @@ class MockLLM(LLMInterface):
         self.response_index = 0
         self.logger = logging.getLogger(__name__)
         
+        # Only templates containing {prompt} need formatting per call
+        self._needs_format = [('{prompt}' in r) for r in self.responses]
+        
+        # Simulated processing delay in seconds (set mock_delay: 0 for load testing)
+        self._delay = config.get('mock_delay', 0.5)
+        
     def generate(self, prompt: str) -> Optional[str]:
         """Generate mock response
         
@@ -189,13 +403,15 @@ class MockLLM(LLMInterface):
             Mock response
         """
         # Simulate processing delay
-        time.sleep(0.5)
+        if self._delay > 0:
+            time.sleep(self._delay)
         
         # Generate response
-        response = self.responses[self.response_index].format(prompt=prompt)
-        self.response_index = (self.response_index + 1) % len(self.responses)
+        i = self.response_index
+        response = self.responses[i].format(prompt=prompt) if self._needs_format[i] else self.responses[i]
+        self.response_index = (i + 1) % len(self.responses)
         
-        self.logger.debug(f"Mock LLM response: {response}")
+        self.logger.debug("Mock LLM response: %s", response)
         return response
         
     def is_available(self) -> bool:
@@ -203,6 +419,14 @@ class MockLLM(LLMInterface):
         return True
 
 
+# Interface class and log label by config 'interface_type' (anything else falls back to MockLLM)
+_INTERFACES = {
+    'command': (CommandLineLLM, "Using command line LLM interface"),
+    'api': (APILLM, "Using API LLM interface"),
+    'mock': (MockLLM, "Using mock LLM interface for testing")
+}
+
+
 class LLMManager:
     """Manager class for LLM interfaces with retry logic"""
     
@@ -213,29 +437,78 @@ class LLMManager:
         self.retry_delay = config.get('retry_delay', 2)
         self.logger = logging.getLogger(__name__)
         
+        # Guards stats and cache, since requests may run on several worker threads
+        self._lock = threading.Lock()
+        
         # Initialize appropriate interface
         self.llm = self._create_interface()
         
-        # Performance tracking
-        self.stats = {
-            'total_requests': 0,
-            'successful_requests': 0,
-            'failed_requests': 0,
-            'total_response_time': 0,
-            'average_response_time': 0
-        }
+        # Performance tracking - plain counters, snapshot built in get_stats()
+        self._reset_counters()
+        
+        # Response cache - only used for deterministic generation (temperature 0), and not
+        # when replies also depend on the previous turn's context
+        self.model = config.get('model', 'tinyllama')
+        self.cache_size = config.get('cache_size', 128)
+        self.cache_enabled = (self.cache_size > 0 and config.get('temperature', 0.7) == 0
+                              and not getattr(self.llm, 'reuse_context', False))
+        self._cache: OrderedDict = OrderedDict()
+        
+        # Optional semantic (embedding similarity) fallback for near-identical prompts
+        self.similarity_threshold = config.get('cache_similarity_threshold', 0.95)
+        self._embedder = None
+        self._embeddings = deque(maxlen=self.cache_size or None)
+        if self.cache_enabled and config.get('semantic_cache', False):
+            self._embedder = self._load_embedder(config.get('semantic_cache_model', 'all-MiniLM-L6-v2'))
+        
+    def _load_embedder(self, model_name: str):
+        """Load sentence embedding model for semantic cache lookups"""
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            self.logger.warning("sentence-transformers not installed, semantic cache disabled")
+            return None
+        self.logger.info(f"Loading embedding model for semantic cache: {model_name}")
+        return SentenceTransformer(model_name)
+        
+    def _cache_key(self, prompt: str) -> str:
+        """Build cache key from model and prompt"""
+        return hashlib.sha256(
+            json.dumps({"m": self.model, "p": prompt}, sort_keys=True).encode()
+        ).hexdigest()
+        
+    def _embed(self, prompt: str):
+        """Compute normalized embedding for a prompt"""
+        return self._embedder.encode(prompt, normalize_embeddings=True)
+        
+    def _cache_lookup(self, key: str) -> Optional[str]:
+        """Look up a cached response by exact key"""
+        response = self._cache.get(key)
+        if response is not None:
+            self._cache.move_to_end(key)
+        return response
+        
+    def _semantic_lookup(self, embedding) -> Optional[str]:
+        """Look up a cached response whose prompt embedding is close enough"""
+        for cached_key, cached_embedding in self._embeddings:
+            if cached_key in self._cache and float(embedding @ cached_embedding) >= self.similarity_threshold:
+                return self._cache_lookup(cached_key)
+        return None
+        
+    def _cache_store(self, key: str, embedding, response: str):
+        """Store a response in the LRU cache"""
+        self._cache[key] = response
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        if embedding is not None:
+            self._embeddings.append((key, embedding))
         
     def _create_interface(self) -> LLMInterface:
         """Create appropriate LLM interface based on config"""
-        if self.interface_type == 'command':
-            self.logger.info("Using command line LLM interface")
-            return CommandLineLLM(self.config)
-        elif self.interface_type == 'api':
-            self.logger.info("Using API LLM interface")
-            return APILLM(self.config)
-        else:
-            self.logger.info("Using mock LLM interface for testing")
-            return MockLLM(self.config)
+        interface_class, label = _INTERFACES.get(self.interface_type, _INTERFACES['mock'])
+        self.logger.info(label)
+        return interface_class(self.config)
             
     def process_message(self, message: str) -> Optional[str]:
         """Process message through LLM with retry logic
@@ -246,26 +519,43 @@ class LLMManager:
         Returns:
             LLM response or None if failed
         """
-        self.stats['total_requests'] += 1
+        with self._lock:
+            self._total += 1
         start_time = time.time()
         
+        key = embedding = None
+        if self.cache_enabled:
+            key = self._cache_key(message)
+            if self._embedder is not None:
+                with self._lock:
+                    cached = self._cache_lookup(key)
+                if cached is None:
+                    embedding = self._embed(message)
+                    with self._lock:
+                        cached = self._semantic_lookup(embedding)
+            else:
+                with self._lock:
+                    cached = self._cache_lookup(key)
+            with self._lock:
+                if cached is not None:
+                    # A hit is a successful request, so total = successful + failed still holds
+                    self._cache_hits += 1
+                    self._ok += 1
+                    self._total_time += time.time() - start_time
+                else:
+                    self._cache_misses += 1
+            if cached is not None:
+                self.logger.info("LLM: Response served from cache: \"%s\"", cached)
+                return cached
+            
         for attempt in range(self.max_retries):
             try:
-                self.logger.info(f"LLM: Forwarding to TinyLLM (attempt {attempt + 1}/{self.max_retries})...")
+                self.logger.info("LLM: Forwarding to TinyLLM (attempt %d/%d)...", attempt + 1, self.max_retries)
                 
                 response = self.llm.generate(message)
                 
                 if response:
-                    # Success
-                    elapsed_time = time.time() - start_time
-                    self.stats['successful_requests'] += 1
-                    self.stats['total_response_time'] += elapsed_time
-                    self.stats['average_response_time'] = (
-                        self.stats['total_response_time'] / self.stats['successful_requests']
-                    )
-                    
-                    self.logger.info(f"LLM: Response received ({elapsed_time:.3f}s): \"{response}\"")
-                    return response
+                    return self._record_success(start_time, key, embedding, response)
                     
                 # Failed, retry if attempts remain
                 if attempt < self.max_retries - 1:
@@ -276,22 +566,70 @@ class LLMManager:
                 self.logger.error(f"Error processing message: {e}")
                 if attempt < self.max_retries - 1:
                     time.sleep(self.retry_delay)
-                    
+                        
         # All attempts failed
-        self.stats['failed_requests'] += 1
+        with self._lock:
+            self._failed += 1
         self.logger.error("All LLM request attempts failed")
         return None
         
+    def _record_success(self, start_time: float, key: Optional[str], embedding, response: str) -> str:
+        """Update statistics and cache for a successful response"""
+        elapsed_time = time.time() - start_time
+        with self._lock:
+            self._ok += 1
+            self._total_time += elapsed_time
+            if self.cache_enabled:
+                self._cache_store(key, embedding, response)
+                
+        self.logger.info("LLM: Response received (%.3fs): \"%s\"", elapsed_time, response)
+        return response
+        
+    def close(self):
+        """Release resources held by the LLM interface"""
+        if hasattr(self.llm, 'close'):
+            self.llm.close()
+            
+    def reset_context(self):
+        """Start a new conversation on interfaces that keep context between turns"""
+        if hasattr(self.llm, 'reset_context'):
+            self.llm.reset_context()
+            self.logger.info("LLM conversation context reset")
+            
     def is_available(self) -> bool:
         """Check if LLM is available"""
         return self.llm.is_available()
         
     def get_stats(self) -> Dict[str, Any]:
         """Get LLM processing statistics"""
-        return self.stats.copy()
+        with self._lock:
+            return {
+                'total_requests': self._total,
+                'successful_requests': self._ok,
+                'failed_requests': self._failed,
+                'total_response_time': self._total_time,
+                'average_response_time': self._total_time / self._ok if self._ok else 0.0,
+                'cache_hits': self._cache_hits,
+                'cache_misses': self._cache_misses
+            }
         
     def reset_stats(self):
         """Reset statistics"""
-        for key in self.stats:
-            self.stats[key] = 0
-        self.logger.info("LLM statistics reset")
\ No newline at end of file
+        with self._lock:
+            self._reset_counters()
+        self.logger.info("LLM statistics reset")
+        
+    def _reset_counters(self):
+        """Zero all statistics counters"""
+        self._total = 0
+        self._ok = 0
+        self._failed = 0
+        self._total_time = 0.0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        
+    def clear_cache(self):
+        """Drop all cached responses"""
+        with self._lock:
+            self._cache.clear()
+            self._embeddings.clear()
\ No newline at end of file
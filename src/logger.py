@@ -1,12 +1,41 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
-from datetime import datetime
+import time
 from colorama import init, Fore, Back, Style
 from typing import Optional
 
 
-# Initialize colorama for cross-platform colored output
-init(autoreset=True)
+# colorama is initialized on first use of colored console output
+_colors_ready = False
+
+# Background writer feeding the log file, if file logging is enabled
+_file_listener: Optional['FlushOnIdleQueueListener'] = None
+
+
+def _ansi_passthrough(stream) -> bool:
+    """Whether ANSI codes can go to the stream untouched (a terminal on a POSIX system)"""
+    isatty = getattr(stream, 'isatty', None)
+    return os.name != 'nt' and isatty is not None and isatty()
+
+
+def _init_colors():
+    """Initialize colorama for cross-platform colored output, once"""
+    global _colors_ready
+    if _colors_ready:
+        return
+    _colors_ready = True
+    
+    if _ansi_passthrough(sys.stdout):
+        # Codes are already in the right form and every template resets its colors,
+        # so leave stdout unwrapped
+        init(strip=False, convert=False)
+    else:
+        # Strip codes when redirected, convert them for Windows consoles
+        init(autoreset=True)
 
 
 class ColoredFormatter(logging.Formatter):
@@ -30,52 +59,144 @@ class ColoredFormatter(logging.Formatter):
         'SYSTEM': Fore.YELLOW
     }
     
-    def format(self, record):
-        # Get the original formatted message
-        original = super().format(record)
+    # Formatted HH:MM:SS for the most recent second, as (epoch second, string)
+    _ts_cache = (None, "")
+    
+    @classmethod
+    def _timestamp(cls, record: logging.LogRecord) -> str:
+        """Record creation time as HH:MM:SS.mmm, calling strftime at most once per second"""
+        sec = int(record.created)
+        cached_sec, cached_str = cls._ts_cache
+        if sec != cached_sec:
+            cached_str = time.strftime("%H:%M:%S", time.localtime(sec))
+            cls._ts_cache = (sec, cached_str)
+        return f"{cached_str}.{int(record.msecs):03d}"
+        
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (levelname, component) -> preformatted line with {ts} and {msg} slots
+        self._templates = {}
+        for level in self.COLORS:
+            self._build_template(level, None)
+            for comp in self.COMPONENT_COLORS:
+                self._build_template(level, comp)
+                
+    def _build_template(self, level: str, component: Optional[str]) -> str:
+        """Build and cache the colored line template for a level/component pair
+        
+        Args:
+            level: Record level name
+            component: Component prefix (e.g. SERIAL), or None
+            
+        Returns:
+            Template string with {ts} and {msg} placeholders
+        """
+        level_color = self.COLORS.get(level, Fore.WHITE)
+        # Escape braces in the constant parts so only ts/msg are substituted
+        padded = f"{level:<8}".replace('{', '{{').replace('}', '}}')
+        if component:
+            template = (
+                f"{Fore.WHITE}[{{ts}}] "
+                f"{level_color}{padded} "
+                f"{self.COMPONENT_COLORS[component]}{component}:{Style.RESET_ALL} "
+                f"{{msg}}"
+            )
+        else:
+            template = (
+                f"{Fore.WHITE}[{{ts}}] "
+                f"{level_color}{padded} "
+                f"{Style.RESET_ALL}{{msg}}"
+            )
+        self._templates[(level, component)] = template
+        return template
         
-        # Get color for log level
-        level_color = self.COLORS.get(record.levelname, Fore.WHITE)
+    def format(self, record):
+        # Merge args into the message once; the line is built from the templates below,
+        # so the base formatter isn't needed
+        record.message = message = record.getMessage()
         
-        # Extract component from message if present
+        # Extract component from message if present (components never contain ':')
         component = None
-        component_color = Fore.WHITE
         
-        for comp, color in self.COMPONENT_COLORS.items():
-            if record.getMessage().startswith(f"{comp}:"):
-                component = comp
-                component_color = color
-                break
+        idx = message.find(':')
+        if 0 < idx < 10 and message[:idx] in self.COMPONENT_COLORS:
+            component = message[:idx]
+            message = message[idx + 1:].strip()
                 
         # Format timestamp
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        timestamp = self._timestamp(record)
         
         # Build colored output
-        if component:
-            # Message has component prefix
-            msg_parts = record.getMessage().split(':', 1)
-            if len(msg_parts) == 2:
-                colored_output = (
-                    f"{Fore.WHITE}[{timestamp}] "
-                    f"{level_color}{record.levelname:<8} "
-                    f"{component_color}{component}:{Style.RESET_ALL} "
-                    f"{msg_parts[1].strip()}"
-                )
-            else:
-                colored_output = (
-                    f"{Fore.WHITE}[{timestamp}] "
-                    f"{level_color}{record.levelname:<8} "
-                    f"{Style.RESET_ALL}{record.getMessage()}"
-                )
-        else:
-            # Standard message
-            colored_output = (
-                f"{Fore.WHITE}[{timestamp}] "
-                f"{level_color}{record.levelname:<8} "
-                f"{Style.RESET_ALL}{record.getMessage()}"
-            )
-            
-        return colored_output
+        key = (record.levelname, component)
+        template = self._templates.get(key) or self._build_template(*key)
+        return template.format(ts=timestamp, msg=message)
+
+
+class ColoredConsoleHandler(logging.StreamHandler):
+    """Console handler that writes each formatted line to a terminal's byte buffer in one call"""
+    
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        # Only a terminal taking raw ANSI is written to directly; otherwise colorama
+        # has to see the text to strip or convert the codes
+        self._buffer = getattr(self.stream, 'buffer', None) if _ansi_passthrough(self.stream) else None
+        
+    def emit(self, record):
+        try:
+            line = self.format(record) + self.terminator
+            stream = self.stream
+            buffer = self._buffer
+            if buffer is None:
+                stream.write(line)
+                stream.flush()
+                return
+                
+            # Push out anything printed through the text layer first so output stays ordered
+            stream.flush()
+            buffer.write(line.encode(getattr(stream, 'encoding', None) or 'utf-8', 'replace'))
+            buffer.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """File handler with a large write buffer that only flushes itself for warnings and above"""
+    
+    def __init__(self, filename, mode='a', encoding=None, buffer_size: int = 64 * 1024):
+        self.buffer_size = buffer_size
+        super().__init__(filename, mode, encoding)
+        
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=self.buffer_size,
+                    encoding=self.encoding, errors=self.errors)
+        
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.WARNING:
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class FlushOnIdleQueueListener(logging.handlers.QueueListener):
+    """Queue listener that flushes its handlers each time the queue runs dry
+    
+    Bursts of records are written with one flush at the end, and nothing is
+    left sitting in a buffer once logging goes quiet.
+    """
+    
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
 
 
 class LoggerSetup:
@@ -104,11 +225,13 @@ class LoggerSetup:
         root_logger.setLevel(logging.DEBUG)
         
         # Remove any existing handlers
+        LoggerSetup.stop_file_logging()
         root_logger.handlers = []
         
         # Console handler with colored output
         if console_enabled:
-            console_handler = logging.StreamHandler(sys.stdout)
+            _init_colors()
+            console_handler = ColoredConsoleHandler(sys.stdout)
             console_handler.setLevel(getattr(logging, console_level.upper()))
             
             # Use colored formatter for console
@@ -120,7 +243,7 @@ class LoggerSetup:
         
         # File handler with detailed output
         if log_file:
-            file_handler = logging.FileHandler(log_file)
+            file_handler = BufferedFileHandler(log_file)
             file_handler.setLevel(getattr(logging, file_level.upper()))
             
             # Use standard formatter for file
@@ -129,10 +252,27 @@ class LoggerSetup:
                 datefmt='%Y-%m-%d %H:%M:%S'
             )
             file_handler.setFormatter(file_formatter)
-            root_logger.addHandler(file_handler)
+            
+            # Callers only enqueue the record; the listener thread does the disk write
+            global _file_listener
+            log_queue = queue.SimpleQueue()
+            queue_handler = logging.handlers.QueueHandler(log_queue)
+            queue_handler.setLevel(file_handler.level)
+            root_logger.addHandler(queue_handler)
+            _file_listener = FlushOnIdleQueueListener(log_queue, file_handler,
+                                                      respect_handler_level=True)
+            _file_listener.start()
             
         return root_logger
         
+    @staticmethod
+    def stop_file_logging():
+        """Write out any queued file log records and stop the background writer"""
+        global _file_listener
+        if _file_listener is not None:
+            listener, _file_listener = _file_listener, None
+            listener.stop()
+        
     @staticmethod
     def get_logger(name: str) -> logging.Logger:
         """Get a logger instance with the given name
@@ -146,6 +286,10 @@ class LoggerSetup:
         return logging.getLogger(name)
 
 
+# Drain queued file records before logging.shutdown closes the handlers
+atexit.register(LoggerSetup.stop_file_logging)
+
+
 # Utility functions for consistent logging patterns
 def log_serial_event(logger: logging.Logger, message: str, level: str = "INFO"):
     """Log a serial-related event with consistent formatting"""
@@ -170,6 +314,8 @@ def log_system_event(logger: logging.Logger, message: str, level: str = "INFO"):
 # Example output formats for reference
 def print_log_examples():
     """Print example log outputs to show formatting"""
+    _init_colors()
+    
     print("\n" + "="*60)
     print("Example Log Output Formats:")
     print("="*60 + "\n")
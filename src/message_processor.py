@@ -1,12 +1,47 @@
 import re
+import time
 import logging
-from typing import Optional, Dict, Any, List
+import functools
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
 
+# Control characters stripped from messages (everything below 0x20 except \t \n \r, plus DEL)
+_CTRL_TABLE = dict.fromkeys(list(range(0x00, 0x09)) + [0x0b, 0x0c] + list(range(0x0e, 0x20)) + [0x7f])
+
+# Runs of whitespace collapse to a single space
+_WS_RE = re.compile(r'\s+')
+
+# Joins a batch for cleaning in one pass; a Unicode noncharacter, so neither whitespace
+# nor a stripped control character, and not expected in serial text
+_BATCH_SEP = '\uffff'
+
+# Smallest batch worth cleaning as one joined string
+_BATCH_CLEAN_MIN = 16
+
+# Known test message
+_TEST_MESSAGE = "TEST MESSAGE FROM ACORN SYSTEM"
+
+# System message prefixes, or a message wrapped in brackets
+_SYSTEM_RE = re.compile(r'(?:TEST|ACORN|SYSTEM)\s+|\[.*\]$', re.IGNORECASE)
+
+# Shared validation results - callers only read these, so they are never copied
+_VALID = {'valid': True}
+_FAIL_EMPTY = {'valid': False, 'reason': 'Empty message'}
+_FAIL_SHORT = {'valid': False, 'reason': 'Message too short'}
+_FAIL_WHITESPACE = {'valid': False, 'reason': 'Message contains only whitespace'}
+_FAIL_SUSPICIOUS = {'valid': False, 'reason': 'Message contains suspicious patterns'}
+
+
 class MessageProcessor:
     """Processes and validates messages received from serial port"""
     
+    # Context prepended to the message when forwarding it to the LLM, by message type
+    _LLM_PREFIX = {
+        'test': '[ARM System Test] ',
+        'system': '[ARM System Message] ',
+    }
+    
     def __init__(self, config: Dict[str, Any] = None):
         """Initialize message processor
         
@@ -16,17 +51,20 @@ class MessageProcessor:
         self.config = config or {}
         self.logger = logging.getLogger(__name__)
         self.max_message_length = self.config.get('max_message_length', 512)
+        self._fail_oversized = {'valid': False,
+                                'reason': f'Message exceeds max length ({self.max_message_length})'}
+        
+        # Cleaning, validation and classification depend only on the raw string,
+        # so repeated messages (test strings, keepalives) reuse the earlier result
+        self._analyze = functools.lru_cache(maxsize=self.config.get('process_cache_size', 256))(
+            self._analyze_message
+        )
         
         # Statistics tracking
-        self.stats = {
-            'total_messages': 0,
-            'valid_messages': 0,
-            'invalid_messages': 0,
-            'test_messages': 0,
-            'custom_messages': 0,
-            'empty_messages': 0,
-            'oversized_messages': 0
-        }
+        self._reset_counters()
+        
+        # Last formatted timestamp, as (epoch millisecond, ISO string)
+        self._ts_cache = (None, '')
         
     def process(self, raw_message: str) -> Optional[Dict[str, Any]]:
         """Process and validate a raw message
@@ -37,28 +75,40 @@ class MessageProcessor:
         Returns:
             Dict containing processed message info or None if invalid
         """
-        self.stats['total_messages'] += 1
+        # Clean, validate and classify (cached per raw string)
+        return self._record(raw_message, *self._analyze(raw_message))
         
-        # Initial cleaning
-        message = self._clean_message(raw_message)
+    def _record(self, raw_message: str, message: str, validation_result: Dict[str, Any],
+                message_type: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Update statistics for an analyzed message and build its processed form
+        
+        Args:
+            raw_message: Raw message string
+            message: Cleaned message
+            validation_result: Result of validating the cleaned message
+            message_type: Message type, None if invalid
+            
+        Returns:
+            Dict containing processed message info or None if invalid
+        """
+        self._total += 1
         
-        # Validate message
-        validation_result = self._validate_message(message)
         if not validation_result['valid']:
-            self.stats['invalid_messages'] += 1
-            self.logger.warning(f"Invalid message: {validation_result['reason']}")
+            self._invalid += 1
+            if validation_result is _FAIL_EMPTY:
+                self._empty += 1
+            elif validation_result is self._fail_oversized:
+                self._oversized += 1
+            self.logger.warning("Invalid message: %s", validation_result['reason'])
             return None
             
-        self.stats['valid_messages'] += 1
-        
-        # Classify message type
-        message_type = self._classify_message(message)
+        self._valid += 1
         
         # Update type-specific stats
         if message_type == 'test':
-            self.stats['test_messages'] += 1
+            self._test += 1
         elif message_type == 'custom':
-            self.stats['custom_messages'] += 1
+            self._custom += 1
             
         # Create processed message dictionary
         processed = {
@@ -66,13 +116,48 @@ class MessageProcessor:
             'cleaned': message,
             'type': message_type,
             'length': len(message),
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': self._timestamp(),
             'valid': True
         }
         
-        self.logger.debug(f"Processed message: {processed}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Processed message: %r", processed)
         return processed
         
+    def _timestamp(self) -> str:
+        """Current local time in ISO format at millisecond resolution, formatted once per millisecond"""
+        ms = time.time_ns() // 1_000_000
+        cached_ms, cached_str = self._ts_cache
+        if ms != cached_ms:
+            cached_str = datetime.fromtimestamp(ms / 1000).isoformat(timespec='milliseconds')
+            self._ts_cache = (ms, cached_str)
+        return cached_str
+        
+    def _analyze_message(self, raw_message: str) -> Tuple[str, Dict[str, Any], Optional[str]]:
+        """Clean, validate and classify a raw message without touching stats
+        
+        Args:
+            raw_message: Raw message string
+            
+        Returns:
+            Tuple of (cleaned message, validation result, message type or None if invalid)
+        """
+        return self._analyze_cleaned(self._clean_message(raw_message))
+        
+    def _analyze_cleaned(self, message: str) -> Tuple[str, Dict[str, Any], Optional[str]]:
+        """Validate and classify an already cleaned message
+        
+        Args:
+            message: Cleaned message string
+            
+        Returns:
+            Tuple of (cleaned message, validation result, message type or None if invalid)
+        """
+        validation_result = self._validate_message(message)
+        if not validation_result['valid']:
+            return message, validation_result, None
+        return message, validation_result, self._classify_message(message)
+        
     def _clean_message(self, raw_message: str) -> str:
         """Clean and normalize message
         
@@ -82,19 +167,24 @@ class MessageProcessor:
         Returns:
             Cleaned message string
         """
-        # Remove leading/trailing whitespace
-        message = raw_message.strip()
-        
-        # Remove any control characters except newlines (which we'll handle separately)
-        message = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f]', '', message)
+        # Strip outer whitespace and drop control characters (tabs/newlines are kept for the
+        # whitespace pass), then collapse whitespace runs - which also removes any \r\n
+        message = raw_message.strip().translate(_CTRL_TABLE)
+        return _WS_RE.sub(' ', message)
         
-        # Replace multiple spaces with single space
-        message = re.sub(r'\s+', ' ', message)
+    def _clean_batch(self, raw_messages: List[str]) -> Optional[List[str]]:
+        """Clean many messages with a single translate and regex pass over the joined text
         
-        # Remove trailing newlines/carriage returns
-        message = message.rstrip('\r\n')
-        
-        return message
+        Args:
+            raw_messages: Raw message strings
+            
+        Returns:
+            List of cleaned messages, or None if the batch separator occurs in the input
+        """
+        joined = _BATCH_SEP.join([raw_message.strip() for raw_message in raw_messages])
+        if joined.count(_BATCH_SEP) != len(raw_messages) - 1:
+            return None
+        return _WS_RE.sub(' ', joined.translate(_CTRL_TABLE)).split(_BATCH_SEP)
         
     def _validate_message(self, message: str) -> Dict[str, Any]:
         """Validate a cleaned message
@@ -103,31 +193,28 @@ class MessageProcessor:
             message: Cleaned message string
             
         Returns:
-            Dict with 'valid' bool and 'reason' if invalid
+            Dict with 'valid' bool, plus 'reason' if invalid
         """
-        # Check if empty
-        if not message:
-            self.stats['empty_messages'] += 1
-            return {'valid': False, 'reason': 'Empty message'}
-            
-        # Check length
-        if len(message) > self.max_message_length:
-            self.stats['oversized_messages'] += 1
-            return {'valid': False, 'reason': f'Message exceeds max length ({self.max_message_length})'}
+        n = len(message)
+        if n == 0:
+            return _FAIL_EMPTY
+        if n > self.max_message_length:
+            return self._fail_oversized
             
         # Check for minimum meaningful content (at least 3 characters)
-        if len(message) < 3:
-            return {'valid': False, 'reason': 'Message too short'}
+        if n < 3:
+            return _FAIL_SHORT
             
-        # Check if message contains only whitespace
-        if message.isspace():
-            return {'valid': False, 'reason': 'Message contains only whitespace'}
+        # Whitespace runs are collapsed during cleaning, so only short strings can be all-space
+        if n < 10 and message.isspace():
+            return _FAIL_WHITESPACE
             
-        # Check for suspicious patterns (potential corruption)
-        if self._has_suspicious_patterns(message):
-            return {'valid': False, 'reason': 'Message contains suspicious patterns'}
+        # Check for suspicious patterns (potential corruption). Short ASCII messages can't
+        # trip any of the checks, so skip the call for them.
+        if (n > 10 or not message.isascii()) and self._has_suspicious_patterns(message):
+            return _FAIL_SUSPICIOUS
             
-        return {'valid': True}
+        return _VALID
         
     def _has_suspicious_patterns(self, message: str) -> bool:
         """Check for patterns that might indicate corruption
@@ -138,10 +225,11 @@ class MessageProcessor:
         Returns:
             bool: True if suspicious patterns found
         """
-        # Check for excessive non-ASCII characters
-        non_ascii_count = sum(1 for c in message if ord(c) > 127)
-        if non_ascii_count > len(message) * 0.2:  # More than 20% non-ASCII
-            return True
+        # Check for excessive non-ASCII characters (the ASCII-only encode drops them in C)
+        if not message.isascii():
+            non_ascii_count = len(message) - len(message.encode('ascii', 'ignore'))
+            if non_ascii_count > len(message) * 0.2:  # More than 20% non-ASCII
+                return True
             
         # Check for null bytes (shouldn't happen after cleaning, but double-check)
         if '\x00' in message:
@@ -164,22 +252,15 @@ class MessageProcessor:
         Returns:
             Message type string
         """
-        # Check for known test message
-        if message == "TEST MESSAGE FROM ACORN SYSTEM":
+        # Check for known test message (str equality compares lengths before any characters)
+        if message == _TEST_MESSAGE:
             return 'test'
             
-        # Check for patterns that might indicate system messages
-        system_patterns = [
-            r'^TEST\s+',
-            r'^ACORN\s+',
-            r'^SYSTEM\s+',
-            r'^\[.*\]$'  # Messages in brackets
-        ]
-        
-        for pattern in system_patterns:
-            if re.match(pattern, message, re.IGNORECASE):
-                return 'system'
-                
+        # Check for patterns that might indicate system messages - one anchored match
+        # covers every prefix and the bracketed form
+        if _SYSTEM_RE.match(message):
+            return 'system'
+            
         # Default to custom message
         return 'custom'
         
@@ -189,7 +270,15 @@ class MessageProcessor:
         Returns:
             Dictionary of statistics
         """
-        stats_copy = self.stats.copy()
+        stats_copy = {
+            'total_messages': self._total,
+            'valid_messages': self._valid,
+            'invalid_messages': self._invalid,
+            'test_messages': self._test,
+            'custom_messages': self._custom,
+            'empty_messages': self._empty,
+            'oversized_messages': self._oversized
+        }
         
         # Calculate percentages
         if stats_copy['total_messages'] > 0:
@@ -205,10 +294,19 @@ class MessageProcessor:
         
     def reset_stats(self):
         """Reset statistics counters"""
-        for key in self.stats:
-            self.stats[key] = 0
+        self._reset_counters()
         self.logger.info("Message processor statistics reset")
         
+    def _reset_counters(self):
+        """Zero all statistics counters"""
+        self._total = 0
+        self._valid = 0
+        self._invalid = 0
+        self._test = 0
+        self._custom = 0
+        self._empty = 0
+        self._oversized = 0
+        
     def format_message_for_llm(self, processed_message: Dict[str, Any]) -> str:
         """Format processed message for LLM consumption
         
@@ -218,19 +316,9 @@ class MessageProcessor:
         Returns:
             Formatted string for LLM
         """
-        # Extract the cleaned message
-        message = processed_message.get('cleaned', '')
-        message_type = processed_message.get('type', 'unknown')
-        
-        # Add context based on message type
-        if message_type == 'test':
-            # For test messages, we might want to add context
-            return f"[ARM System Test] {message}"
-        elif message_type == 'system':
-            return f"[ARM System Message] {message}"
-        else:
-            # For custom messages, return as-is
-            return message
+        # Add context based on message type; custom messages are passed as-is
+        return (self._LLM_PREFIX.get(processed_message.get('type'), '')
+                + processed_message.get('cleaned', ''))
             
     def batch_process(self, messages: List[str]) -> List[Dict[str, Any]]:
         """Process multiple messages at once
@@ -241,9 +329,15 @@ class MessageProcessor:
         Returns:
             List of processed message dictionaries
         """
+        # Large batches are cleaned in one pass instead of message by message
+        cleaned = self._clean_batch(messages) if len(messages) >= _BATCH_CLEAN_MIN else None
+        
         processed = []
-        for message in messages:
-            result = self.process(message)
+        for i, message in enumerate(messages):
+            if cleaned is None:
+                result = self.process(message)
+            else:
+                result = self._record(message, *self._analyze_cleaned(cleaned[i]))
             if result:
                 processed.append(result)
                 
@@ -1,8 +1,8 @@
 import serial
 import time
 import threading
-import queue
 import logging
+from collections import deque
 from typing import Optional, Callable, Dict, Any
 import signal
 import sys
@@ -20,12 +20,27 @@ class SerialClient:
         self.config = config
         self.port = None
         self.running = False
-        self.message_queue = queue.Queue()
+        # Single producer (read thread) / single consumer queue of raw line bytes;
+        # deque append/popleft are atomic, the event only wakes an idle consumer
+        self.message_queue = deque()
+        self._have_data = threading.Event()
         self.logger = logging.getLogger(__name__)
         self.read_thread = None
+        self.dispatch_thread = None
         self.reconnect_attempts = config.get('reconnect_attempts', 5)
         self.reconnect_delay = config.get('reconnect_delay', 2)
         
+        # Reads wait up to the configured timeout for data, then lines are split in-process;
+        # an idle timeout with bytes still buffered delivers them as a partial line.
+        # read_timeout overrides the port timeout for reads (None blocks until data arrives,
+        # with stop() cancelling the pending read, and partial lines wait until stop).
+        self.read_timeout = config.get('read_timeout', config.get('timeout', 1))
+        self.max_line_length = config.get('max_line_length', 4096)
+        self._rx_buf = bytearray()
+        
+        # Outgoing messages go out in one write unless the adapter needs paced 64-byte chunks
+        self.chunked_writes = config.get('chunked_writes', False)
+        
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -51,6 +66,7 @@ class SerialClient:
                 'parity': serial.PARITY_NONE,
                 'stopbits': serial.STOPBITS_ONE,
                 'timeout': self.config.get('timeout', 1),
+                'write_timeout': self.config.get('write_timeout', 1.0),
                 'xonxoff': False,
                 'rtscts': False,
                 'dsrdtr': False
@@ -62,6 +78,12 @@ class SerialClient:
             # Clear any buffered data
             self.port.reset_input_buffer()
             self.port.reset_output_buffer()
+            if self.read_timeout is None and not hasattr(self.port, 'cancel_read'):
+                # Port can't be woken on stop, so keep the configured timeout
+                self.port.timeout = serial_config['timeout']
+            else:
+                self.port.timeout = self.read_timeout
+            self._rx_buf.clear()
             
             self.logger.info("Serial connection established successfully")
             return True
@@ -93,23 +115,36 @@ class SerialClient:
                 raise RuntimeError("Cannot start - serial port not connected")
                 
         self.running = True
-        self.read_thread = threading.Thread(target=self._read_loop, args=(message_callback,))
+        self.read_thread = threading.Thread(target=self._read_loop)
         self.read_thread.daemon = True
         self.read_thread.start()
+        
+        # Decoding and the callback run on their own thread so the reader only does I/O
+        if message_callback:
+            self.dispatch_thread = threading.Thread(target=self._dispatch_loop, args=(message_callback,))
+            self.dispatch_thread.daemon = True
+            self.dispatch_thread.start()
         self.logger.info("Serial reading thread started")
         
     def stop(self):
         """Stop reading from serial port"""
         self.running = False
+        if self.port and self.port.is_open and hasattr(self.port, 'cancel_read'):
+            # Wake the reader if it's blocked waiting for data
+            self.port.cancel_read()
         if self.read_thread:
             self.read_thread.join(timeout=2)
+        self._flush_partial()
+        if self.dispatch_thread:
+            self._push_line(b'')  # Empty line wakes the dispatcher and tells it to exit
+            self.dispatch_thread.join(timeout=2)
+            self.dispatch_thread = None
         self.disconnect()
         
-    def _read_loop(self, message_callback: Optional[Callable[[str], None]] = None):
+    def _read_loop(self):
         """Main reading loop running in separate thread
         
-        Args:
-            message_callback: Optional callback to handle messages
+        Queues each received line as raw bytes; decoding happens on the consumer side.
         """
         consecutive_errors = 0
         
@@ -121,36 +156,15 @@ class SerialClient:
                         time.sleep(self.reconnect_delay)
                         continue
                         
-                # Read data from serial port
-                if self.port.in_waiting > 0:
-                    try:
-                        # Read available data
-                        raw_data = self.port.readline()
-                        
-                        if raw_data:
-                            # Decode and clean the message
-                            message = raw_data.decode('ascii', errors='ignore').strip()
-                            
-                            if message:
-                                self.logger.debug(f"Received raw data: {raw_data}")
-                                self.logger.info(f"Received message: '{message}'")
-                                
-                                # Add to queue
-                                self.message_queue.put(message)
-                                
-                                # Call callback if provided
-                                if message_callback:
-                                    message_callback(message)
-                                    
-                                consecutive_errors = 0
-                                
-                    except UnicodeDecodeError as e:
-                        self.logger.error(f"Failed to decode message: {e}")
-                        self.logger.debug(f"Raw bytes: {raw_data}")
-                        
-                else:
-                    # No data available, sleep briefly
-                    time.sleep(0.01)
+                # Read everything buffered in one call; when idle this waits up to the read timeout
+                chunk = self.port.read(max(1, self.port.in_waiting))
+                if not chunk:
+                    # Line went idle - deliver an unterminated partial line
+                    self._flush_partial()
+                    continue
+                    
+                if self._feed(chunk):
+                    consecutive_errors = 0
                     
             except serial.SerialException as e:
                 consecutive_errors += 1
@@ -165,6 +179,105 @@ class SerialClient:
                 self.logger.error(f"Unexpected error in read loop: {e}")
                 time.sleep(0.1)
                 
+    def _feed(self, chunk: bytes) -> bool:
+        """Add received bytes to the line buffer and queue every completed line
+        
+        Args:
+            chunk: Bytes as read from the port
+            
+        Returns:
+            bool: True if at least one line was queued
+        """
+        rx_buf = self._rx_buf
+        rx_buf += chunk
+        queued = False
+        while True:
+            nl = rx_buf.find(b'\n')
+            if nl == -1:
+                # Don't let a sender that never terminates lines grow the buffer forever
+                if len(rx_buf) < self.max_line_length:
+                    break
+                nl = self.max_line_length - 1
+            self._push_line(bytes(rx_buf[:nl + 1]))
+            del rx_buf[:nl + 1]
+            queued = True
+        return queued
+        
+    def _flush_partial(self):
+        """Queue any buffered bytes that never got a line terminator"""
+        if self._rx_buf:
+            self._push_line(bytes(self._rx_buf))
+            self._rx_buf.clear()
+            
+    def _push_line(self, raw_data: bytes):
+        """Queue one received line and wake the consumer
+        
+        Args:
+            raw_data: Line bytes as read from the port
+        """
+        self.message_queue.append(raw_data)
+        self._have_data.set()
+        
+    def _pop_line(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Take the oldest queued line, waiting for one if the queue is empty
+        
+        Args:
+            timeout: Maximum time to wait, or None to wait indefinitely
+            
+        Returns:
+            bytes or None: Queued line, None if timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self.message_queue.popleft()
+            except IndexError:
+                pass
+                
+            # Clear before re-checking so an append between the two is never missed
+            self._have_data.clear()
+            if self.message_queue:
+                continue
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            self._have_data.wait(remaining)
+            
+    def _decode_line(self, raw_data: bytes) -> str:
+        """Decode and clean one received line
+        
+        Args:
+            raw_data: Line bytes as read from the port
+            
+        Returns:
+            str: Decoded message, empty if the line held nothing printable
+        """
+        message = raw_data.decode('ascii', errors='ignore').strip()
+        if message and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Received raw data: %r", raw_data)
+            self.logger.debug("Received message: '%s'", message)
+        return message
+        
+    def _dispatch_loop(self, message_callback: Callable[[str], None]):
+        """Decode queued lines and pass them to the callback until stopped
+        
+        Args:
+            message_callback: Callback to handle messages
+        """
+        while True:
+            raw_data = self._pop_line()
+            if not raw_data:
+                break
+                
+            message = self._decode_line(raw_data)
+            if not message:
+                continue
+                
+            try:
+                message_callback(message)
+            except Exception as e:
+                self.logger.error(f"Unexpected error in message callback: {e}")
+                
     def _reconnect(self) -> bool:
         """Attempt to reconnect to serial port
         
@@ -194,10 +307,17 @@ class SerialClient:
         Returns:
             str or None: Message if available, None if timeout
         """
-        try:
-            return self.message_queue.get(timeout=timeout)
-        except queue.Empty:
-            return None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            raw_data = self._pop_line(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if raw_data is None:
+                return None
+                
+            # Skip blank lines and stop sentinels
+            if raw_data:
+                message = self._decode_line(raw_data)
+                if message:
+                    return message
             
     def send_message(self, message: str) -> bool:
         """Send message over serial port (if needed for bidirectional communication)
@@ -217,16 +337,23 @@ class SerialClient:
             if not message.endswith('\n'):
                 message += '\n'
                 
-            # Send in smaller chunks to avoid buffer overflow
-            chunk_size = 64  # Safe size for most serial buffers
             message_bytes = message.encode('ascii')
             
-            for i in range(0, len(message_bytes), chunk_size):
-                chunk = message_bytes[i:i+chunk_size]
-                self.port.write(chunk)
-                time.sleep(0.01)  # Small delay between chunks
-                
-            self.logger.debug(f"Sent message: '{message.strip()}'")
+            if self.chunked_writes:
+                # Legacy mode for USB-serial adapters that drop data when their buffer fills
+                chunk_size = 64  # Safe size for most serial buffers
+                for i in range(0, len(message_bytes), chunk_size):
+                    chunk = message_bytes[i:i+chunk_size]
+                    self.port.write(chunk)
+                    time.sleep(0.01)  # Small delay between chunks
+            else:
+                # One write; the driver paces output and write_timeout bounds the wait
+                written = self.port.write(message_bytes)
+                if written is not None and written != len(message_bytes):
+                    raise IOError(f"Short write ({written}/{len(message_bytes)} bytes)")
+                    
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Sent message: '%s'", message.strip())
             return True
             
         except Exception as e:
@@ -243,6 +370,6 @@ class SerialClient:
             'connected': self.port.is_open if self.port else False,
             'port': self.config.get('port', 'Unknown'),
             'baudrate': self.config.get('baudrate', 'Unknown'),
-            'messages_in_queue': self.message_queue.qsize(),
+            'messages_in_queue': len(self.message_queue),
             'thread_alive': self.read_thread.is_alive() if self.read_thread else False
         }
\ No newline at end of file
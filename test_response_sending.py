@@ -5,12 +5,26 @@ Test script for LLM response sending functionality
 
 import sys
 import os
+from functools import lru_cache
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from serial_client import SerialClient
-from message_processor import MessageProcessor
-from llm_interface import LLMManager
-from main import TinyLLMSerialClient
+# Project modules (pyserial, requests) and yaml are imported by the tests that use them
+
+@lru_cache(maxsize=8)
+def _parse_config(path, mtime):
+    """Parse a YAML config file (cached until the file changes)"""
+    import yaml
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:
+        from yaml import SafeLoader as Loader
+        
+    with open(path, 'rb') as f:
+        return yaml.load(f, Loader=Loader)
+
+def load_config(path):
+    """Load a YAML config file, reusing the parsed result while its mtime is unchanged"""
+    return _parse_config(path, os.stat(path).st_mtime)
 
 def test_response_formatting():
     """Test response formatting functionality"""
@@ -26,30 +40,28 @@ def test_response_formatting():
         }
     }
     
-    # Test normal response
-    response = "This is a test response from the AI."
-    
     # Test the _send_response method logic
     response_config = config.get('response', {})
     max_length = response_config.get('max_length', 500)
     prefix = response_config.get('prefix', 'AI: ')
     suffix = response_config.get('suffix', '\n---\n')
     
-    # Format response
-    if len(response) > max_length - len(prefix) - len(suffix):
-        response = response[:max_length - len(prefix) - len(suffix) - 3] + "..."
+    # Space left for the response body once prefix and suffix are added
+    budget = max_length - len(prefix) - len(suffix)
+    
+    def format_response(text):
+        body = text if len(text) <= budget else text[:budget - 3] + "..."
+        return prefix + body + suffix
         
-    formatted_response = f"{prefix}{response}{suffix}"
+    # Test normal response
+    response = "This is a test response from the AI."
+    formatted_response = format_response(response)
     
     print(f"✅ Original: {response}")
     print(f"✅ Formatted: {repr(formatted_response)}")
     
-    # Test long response truncation
-    long_response = "This is a very long response " * 10
-    if len(long_response) > max_length - len(prefix) - len(suffix):
-        long_response = long_response[:max_length - len(prefix) - len(suffix) - 3] + "..."
-        
-    formatted_long = f"{prefix}{long_response}{suffix}"
+    # Test long response truncation (input must exceed the budget to exercise it)
+    formatted_long = format_response("This is a very long response " * 10)
     print(f"✅ Long response truncated: {len(formatted_long)} chars")
     print(f"✅ Content: {repr(formatted_long)}")
 
@@ -57,6 +69,8 @@ def test_serial_send_method():
     """Test the serial client send_message method"""
     print("\n🧪 Testing SerialClient.send_message method...")
     
+    from serial_client import SerialClient
+    
     config = {
         'port': '/dev/null',  # Won't actually connect
         'baudrate': 9600,
@@ -76,17 +90,14 @@ def test_config_loading():
     
     # Test client_config.yaml
     try:
-        import yaml
-        with open('config/client_config.yaml', 'r') as f:
-            config = yaml.safe_load(f)
-            
+        config = load_config('config/client_config.yaml')
+        
         response_config = config.get('response', {})
         print(f"✅ client_config.yaml response settings: {response_config}")
         
         # Test rpi_config.yaml
-        with open('config/rpi_config.yaml', 'r') as f:
-            rpi_config = yaml.safe_load(f)
-            
+        rpi_config = load_config('config/rpi_config.yaml')
+        
         rpi_response_config = rpi_config.get('response', {})
         print(f"✅ rpi_config.yaml response settings: {rpi_response_config}")
         
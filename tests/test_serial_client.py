@@ -5,40 +5,182 @@ import sys
 import os
 import time
 import threading
+import tempfile
+import json
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from serial_client import SerialClient
 from message_processor import MessageProcessor
-from llm_interface import LLMManager
+from llm_interface import LLMManager, APILLM
 from logger import LoggerSetup
 
 
+# Message processor test inputs, built once
+PROCESSOR_TEST_MESSAGES = (
+    "TEST MESSAGE FROM ACORN SYSTEM",
+    "  TEST MESSAGE FROM ACORN SYSTEM\n",
+    "Custom message with special chars: !@#$%",
+    "",  # Empty message
+    "A" * 600,  # Too long
+    "   \n\r   ",  # Whitespace only
+)
+
+
 def test_message_processor():
     """Test message processing functionality"""
     print("Testing Message Processor...")
     
     processor = MessageProcessor()
     
-    test_messages = [
-        "TEST MESSAGE FROM ACORN SYSTEM",
-        "  TEST MESSAGE FROM ACORN SYSTEM\n",
-        "Custom message with special chars: !@#$%",
-        "",  # Empty message
-        "A" * 600,  # Too long
-        "   \n\r   ",  # Whitespace only
-    ]
-    
-    for i, msg in enumerate(test_messages, 1):
-        print(f"\nTest {i}: '{msg[:50]}{'...' if len(msg) > 50 else ''}'")
+    # Collect the report and write it out in one go
+    lines = []
+    for i, msg in enumerate(PROCESSOR_TEST_MESSAGES, 1):
+        lines.append(f"\nTest {i}: '{msg[:50]}{'...' if len(msg) > 50 else ''}'")
         result = processor.process(msg)
         if result:
-            print(f"  ✓ Valid - Type: {result['type']}, Length: {result['length']}")
+            lines.append(f"  ✓ Valid - Type: {result['type']}, Length: {result['length']}")
         else:
-            print(f"  ✗ Invalid message")
+            lines.append(f"  ✗ Invalid message")
             
-    print(f"\nProcessor Stats: {processor.get_stats()}")
+    lines.append(f"\nProcessor Stats: {processor.get_stats()}")
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+
+class FakePort:
+    """Stand-in serial port that returns queued chunks, then b'' as an idle read timeout"""
+    
+    def __init__(self, chunks, client):
+        self.chunks = list(chunks)
+        self.client = client
+        self.is_open = True
+        
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+        
+    def read(self, size=1):
+        if not self.chunks:
+            self.client.running = False  # One idle timeout, then end the read loop
+            return b''
+        return self.chunks.pop(0)
+        
+    def close(self):
+        self.is_open = False
+
+
+def test_line_splitter():
+    """Test splitting received serial bytes into lines"""
+    print("\nTesting Serial Line Splitter...")
+    
+    client = SerialClient({'max_line_length': 16})
+    
+    # Lines split across chunks, CRLF endings and an over-length line without a newline
+    for chunk in (b"HEL", b"LO\nWOR", b"LD\r\n", b"B" * 20, b"\n", b"NO_NEWLINE"):
+        client._feed(chunk)
+        
+    lines = [client.get_message(timeout=0) for _ in range(4)]
+    assert lines == ["HELLO", "WORLD", "B" * 16, "B" * 4], lines
+    assert client.get_message(timeout=0) is None
+    
+    # The unterminated tail is delivered on stop
+    client.stop()
+    assert client.get_message(timeout=0) == "NO_NEWLINE"
+    
+    # ...and when a read times out with bytes still buffered
+    client = SerialClient({})
+    client.port = FakePort([b"HEL", b"LO\nWOR", b"LD\r\n", b"NO_NEWLINE"], client)
+    client.running = True
+    client._read_loop()
+    lines = [client.get_message(timeout=0) for _ in range(4)]
+    assert lines == ["HELLO", "WORLD", "NO_NEWLINE", None], lines
+    
+    print("  ✓ Split chunks, CRLF, over-length cut and partial lines delivered")
+
+
+def _make_client(tmp, tinyllm=""):
+    """Build a main application client on the mock LLM, logging into tmp"""
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from main import TinyLLMSerialClient
+    
+    config_path = os.path.join(tmp, 'config.yaml')
+    with open(config_path, 'w') as f:
+        f.write("tinyllm:\n  interface_type: mock\n" + tinyllm +
+                f"logging:\n  console: false\n  file: {os.path.join(tmp, 'client.log')}\n")
+    return TinyLLMSerialClient(config_path, test_mode=True)
+
+
+def test_echo_detection():
+    """Test echo detection against recently sent messages"""
+    print("\nTesting Echo Detection...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_client(tmp)
+        
+        # An expired longer message must not hide a recent one it contains
+        client.sent_messages.append((time.monotonic() - 10, "status report ok"))
+        client._track_sent_message("status")
+        assert client._is_echo_message("status report ok!")
+        assert client._is_echo_message("AI: anything")
+        assert not client._is_echo_message("report ok")
+        
+        client._llm_pool.shutdown()
+        
+    print("  ✓ Only messages inside the echo window are matched")
+
+
+class FakeStreamResponse:
+    """Streamed Ollama response yielding the given text chunks"""
+    
+    def __init__(self, chunks):
+        self.lines = [json.dumps({'response': chunk, 'done': False}).encode() for chunk in chunks]
+        self.lines.append(json.dumps({'response': '', 'done': True, 'context': [1, 2]}).encode())
+        
+    def iter_lines(self):
+        return iter(self.lines)
+        
+    def close(self):
+        pass
+
+
+def test_stop_with_backlog():
+    """Test that stopping the client doesn't wait for queued LLM requests"""
+    print("\nTesting Stop With Queued Requests...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        client = _make_client(tmp, "  mock_delay: 1\n  max_workers: 2\n")
+        for i in range(10):
+            client.message_callback(f"QUEUED MESSAGE {i}")
+            
+        # Only the two in-flight requests finish; the other eight are dropped
+        start_time = time.monotonic()
+        client.stop()
+        elapsed = time.monotonic() - start_time
+        assert elapsed < 2.5, f"stop() took {elapsed:.1f}s"
+        
+    print(f"  ✓ Stopped in {elapsed:.1f}s with 10 requests queued")
+
+
+def test_stream_sentence_stop():
+    """Test stopping a streamed response at the end of the first sentence"""
+    print("\nTesting Streamed Sentence Stop...")
+    
+    llm = APILLM({'stream': True, 'stop_at_sentence': True})
+    
+    # A decimal split across tokens is not a sentence end
+    text = llm._read_stream(FakeStreamResponse(["Pi is 3", ".", "14 roughly", ". Next", " sentence."]))
+    assert text == "Pi is 3.14 roughly.", repr(text)
+    
+    # A blank line ends the response too
+    text = llm._read_stream(FakeStreamResponse(["Line one\n", "\nLine two"]))
+    assert text == "Line one\n\n", repr(text)
+    
+    # Without a sentence end the whole stream is read
+    text = llm._read_stream(FakeStreamResponse(["Version 1.", "2 is out"]))
+    assert text == "Version 1.2 is out", repr(text)
+    
+    print("  ✓ Decimals don't stop the stream; sentence ends and blank lines do")
 
 
 def test_llm_interface():
@@ -71,6 +213,38 @@ def test_llm_interface():
     print(f"\nLLM Stats: {llm_manager.get_stats()}")
 
 
+def test_response_cache():
+    """Test the LLM response cache"""
+    print("\nTesting LLM Response Cache...")
+    
+    llm_manager = LLMManager({'interface_type': 'mock', 'mock_delay': 0, 'temperature': 0, 'cache_size': 2})
+    
+    # A repeated prompt is served from the cache
+    first = llm_manager.process_message("PROMPT A")
+    assert llm_manager.process_message("PROMPT A") == first
+    
+    # Least recently used entry is evicted once the cache is full
+    llm_manager.process_message("PROMPT B")
+    llm_manager.process_message("PROMPT C")
+    assert llm_manager.process_message("PROMPT A") != first
+    stats = llm_manager.get_stats()
+    assert (stats['cache_hits'], stats['cache_misses']) == (1, 4), stats
+    
+    # Hits count as successful requests, so the request counters add up
+    assert stats['total_requests'] == stats['successful_requests'] + stats['failed_requests'] == 5, stats
+    
+    # Non-zero temperature disables the cache
+    llm_manager = LLMManager({'interface_type': 'mock', 'mock_delay': 0, 'temperature': 0.7})
+    assert llm_manager.process_message("PROMPT A") != llm_manager.process_message("PROMPT A")
+    assert llm_manager.get_stats()['cache_hits'] == 0
+    
+    # Replies that depend on the previous turn's context are never cached
+    llm_manager = LLMManager({'interface_type': 'api', 'temperature': 0, 'reuse_context': True})
+    assert not llm_manager.cache_enabled
+    
+    print("  ✓ Cache hits, LRU eviction, stats and cache gates")
+
+
 def test_integration():
     """Test integration between components"""
     print("\nTesting Integration...")
@@ -128,7 +302,12 @@ def main():
     
     try:
         test_message_processor()
+        test_line_splitter()
+        test_echo_detection()
+        test_stop_with_backlog()
+        test_stream_sentence_stop()
         test_llm_interface()
+        test_response_cache()
         test_integration()
         
         print("\n" + "="*60)